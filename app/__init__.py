@@ -14,28 +14,14 @@ def create_app():
     )
 
     app.secret_key = os.getenv("APP_SECRET", "dev-secret")
-
-    from .config import SCOPE, CLIENT_ID, CLIENT_SECRET, REDIRECT_URI
-    from spotipy.oauth2 import SpotifyOAuth
-
-    app.config["SP_OAUTH"] = SpotifyOAuth(
-        client_id=CLIENT_ID,
-        client_secret=CLIENT_SECRET,
-        redirect_uri=REDIRECT_URI,
-        scope=SCOPE,
-        cache_path=None,
-        cache_handler=None,
-        show_dialog=True,
-    )
-
-    from openai import OpenAI
-
-    openai_key = os.getenv("OPENAI_API_KEY")
-    if not openai_key:
-        # This will show up in your terminal / logs if the key is missing
-        print("⚠️ OPENAI_API_KEY is not set! Embeddings will fail.")
-
-    app.config["OPENAI_CLIENT"] = OpenAI(api_key=openai_key)
+    if not os.getenv("APP_SECRET"):
+        # Sessions only hold a random login handle, but cookies are still forgeable
+        print("⚠️ APP_SECRET is not set! Using the insecure dev secret.")
+
+    # SP_OAUTH and OPENAI_CLIENT are built lazily on first use,
+    # see app/services/clients.py
+    app.config["SP_OAUTH"] = None
+    app.config["OPENAI_CLIENT"] = None
 
     app.config["GENIUS_API_KEY"] = os.getenv("GENIUS_API_KEY")
 
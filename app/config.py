@@ -14,3 +14,22 @@ SCOPE = ("user-read-private user-read-email "
 
 SPLIT_RE = re.compile(r"\s*(?:,|/|&| and )\s*", re.I)
 CLEAN_RE = re.compile(r"[^A-Za-z0-9 .'\-&/]")
+
+# Generated playlist size (request parameter "track_count")
+DEFAULT_TRACK_COUNT = 100
+MAX_TRACK_COUNT     = 1000
+
+# Table the lyric embeddings live in and the RPC that searches it. A re-embed
+# (new preprocessing or dimensions) goes into a fresh table; pointing these at
+# it switches the app over in one step.
+EMBEDDINGS_TABLE = os.getenv("EMBEDDINGS_TABLE", "song_embeddings")
+MATCH_RPC        = os.getenv("MATCH_RPC", "match_lyrics_similarity")
+
+# Optional shorter embeddings (text-embedding-3 "dimensions" parameter).
+# EMBEDDINGS_TABLE.embedding and MATCH_RPC must use the same size.
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS")) if os.getenv("EMBEDDING_DIMENSIONS") else None
+
+# Token-aware lyric preprocessing before embedding (lyrics_preprocess.py).
+# Off until EMBEDDINGS_TABLE holds vectors made with it, so one vector
+# search never mixes vectors from both methods.
+LYRICS_PREPROCESS = os.getenv("LYRICS_PREPROCESS", "").lower() in ("1", "true", "yes")
@@ -1,5 +1,7 @@
-from flask import Blueprint, current_app, redirect, request, session, url_for
+from flask import Blueprint, redirect, request, session, url_for
 import requests
+from ..services.clients import get_sp_oauth
+from ..services.token_store import get_token_store
 
 auth_bp = Blueprint("auth", __name__)
 
@@ -7,7 +9,7 @@ auth_bp = Blueprint("auth", __name__)
 def login():
     session.clear()
 
-    sp_oauth = current_app.config["SP_OAUTH"]
+    sp_oauth = get_sp_oauth()
     return redirect(sp_oauth.get_authorize_url())
 
 @auth_bp.route("/callback", methods=["GET", "HEAD"])
@@ -15,27 +17,31 @@ def callback():
     if request.method == "HEAD":
         return ("", 200)
 
-    sp_oauth = current_app.config["SP_OAUTH"]
+    sp_oauth = get_sp_oauth()
     code = request.args.get("code")
     if not code:
         return redirect(url_for("core.index"))
 
     token_info = sp_oauth.get_access_token(code, check_cache=False)
-    session["token_info"] = token_info
 
     access_token = token_info["access_token"]
     headers = {"Authorization": f"Bearer {access_token}"}
     profile = requests.get("https://api.spotify.com/v1/me", headers=headers).json()
 
-    session["spotify_id"] = profile["id"]
+    spotify_id = profile["id"]
+    # Tokens stay server-side; the cookie only carries a random login handle
+    store = get_token_store()
+    store.save(spotify_id, token_info)
+    session["login"] = store.create_login(spotify_id)
     display_name = profile.get("display_name", "")
 
     # Supabase upsert for the user's info
     try:
-        from ..services.supabase_db import SUPABASE_ADMIN
-        if SUPABASE_ADMIN:
-            SUPABASE_ADMIN.table("users").upsert(
-                {"spotify_id": session["spotify_id"], "display_name": display_name},
+        from ..services.supabase_db import get_supabase_admin
+        admin = get_supabase_admin()
+        if admin:
+            admin.table("users").upsert(
+                {"spotify_id": spotify_id, "display_name": display_name},
                 on_conflict=["spotify_id"]
             ).execute()
     except Exception as e:
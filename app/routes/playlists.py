@@ -1,8 +1,6 @@
 # app/routes/playlists.py
 from flask import Blueprint, render_template, request, session, redirect, url_for, jsonify
-from spotipy import Spotify
 from ..services.spotify_api import ensure_spotify, collect_meta_by_id
-from ..services.recommender import generate_playlist_from_seed
 
 playlists_bp = Blueprint("playlists", __name__)
 
@@ -19,6 +17,7 @@ def select_playlist():
     if not sp:
         return redirect(url_for("auth.login"))
 
+    from spotipy import Spotify
     sp = Spotify(
         auth=access_token,
         requests_timeout=10,
@@ -59,6 +58,7 @@ def generation():
         return redirect(url_for("playlists.select_playlist"))
 
     new_name = request.form.get("new_playlist_name", "Generated Mix")
+    track_count = request.form.get("track_count", type=int)
 
     sp, access_token = ensure_spotify()
     if not sp:
@@ -66,8 +66,11 @@ def generation():
 
     meta_by_id = collect_meta_by_id(sp, pid)
 
+    # deferred: pulls in numpy, bs4, openai and supabase
+    from ..services.recommender import generate_playlist_from_seed
+
     # make generator return {"id": "...", "added": N} 
-    result = generate_playlist_from_seed(sp, access_token, pid, new_name)
+    result = generate_playlist_from_seed(sp, access_token, pid, new_name, track_count=track_count)
 
     new_pl_id = result["id"] if isinstance(result, dict) else result
     added     = (result.get("added", 0) if isinstance(result, dict) else None)
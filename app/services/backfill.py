@@ -0,0 +1,223 @@
+import csv
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Iterator, Optional
+
+from ..config import EMBEDDINGS_TABLE
+from .lyrics_getter import get_lyrics
+from .lyrics_embedding import embed_text, existing_track_ids, save_song_embeddings, embedding_row
+from .supabase_db import get_supabase_admin
+
+log = logging.getLogger("playlistgen")
+
+# text-embedding-3-small list price, USD per 1M tokens
+DEFAULT_PRICE_PER_1M = 0.02
+
+
+def read_tracks(path: str) -> Iterator[dict]:
+    """Stream (track_id, title, artist) rows from a .csv (with header) or .jsonl file."""
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            rows = (json.loads(line) for line in f if line.strip())
+        else:
+            rows = csv.DictReader(f)
+        for row in rows:
+            yield {
+                "track_id": (row.get("track_id") or "").strip(),
+                "title": (row.get("title") or "").strip(),
+                "artist": (row.get("artist") or "").strip(),
+            }
+
+
+def _progress_files(input_path: str) -> list:
+    """Checkpoint and failed-track files run_backfill/retry_failed keep for input_path."""
+    retrying = input_path + ".failed.retrying.jsonl"
+    return [input_path + ".checkpoint.json", input_path + ".failed.jsonl",
+            retrying, retrying + ".checkpoint.json"]
+
+
+def export_catalog(path: str, table=EMBEDDINGS_TABLE, page_size=1000) -> int:
+    """Write every track in table to a CSV that run_backfill can take, e.g. to
+    embed the whole catalog into a new table with a new embedding setup.
+
+    Progress files left over from an earlier backfill of path describe the
+    old file contents, so they are deleted; the new run starts from row 0."""
+    admin = get_supabase_admin()
+    if admin is None:
+        raise RuntimeError("SUPABASE_SERVICE_ROLE_KEY not configured on server")
+
+    for stale in _progress_files(path):
+        if os.path.exists(stale):
+            log.info("backfill: removing stale %s", stale)
+            os.remove(stale)
+
+    n = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["track_id", "title", "artist"])
+        while True:
+            rows = (
+                admin.table(table)
+                .select("track_id,track_name,artist_name")
+                .order("track_id")
+                .range(n, n + page_size - 1)
+                .execute()
+                .data
+            ) or []
+            for r in rows:
+                w.writerow([r["track_id"], r["track_name"], r["artist_name"]])
+            n += len(rows)
+            if len(rows) < page_size:
+                return n
+
+
+class Checkpoint:
+    """Progress for one input file into one table, stored as JSON next to it.
+    `rows` is how many input rows are fully handled; everything before
+    that offset is skipped on resume."""
+
+    def __init__(self, path: str, input_path: str, table: str = EMBEDDINGS_TABLE):
+        self.path = path
+        self.state = {"input": os.path.abspath(input_path), "table": table, "rows": 0,
+                      "embedded": 0, "skipped": 0, "failed": 0, "tokens": 0}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                saved = json.load(f)
+            if saved.get("input") != self.state["input"]:
+                raise ValueError(f"checkpoint {path} belongs to {saved.get('input')}")
+            if saved.get("table", table) != table:
+                raise ValueError(f"checkpoint {path} is for table {saved['table']}, not {table}")
+            self.state.update(saved)
+
+    def save(self) -> None:
+        # write-then-rename so a crash never leaves a half-written checkpoint
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.state, f)
+        os.replace(tmp, self.path)
+
+
+def _process_track(app, row: dict) -> tuple:
+    """Fetch lyrics and embed one track.
+    Returns (embedding row or None, tokens, failure reason or None)."""
+    usage = {}
+    with app.app_context():
+        try:
+            lyrics = get_lyrics(row["title"], row["artist"])
+            if not lyrics:
+                return None, 0, "no_lyrics"
+            emb = embed_text(lyrics, usage=usage)
+        except Exception as e:
+            log.warning("backfill: %s failed: %s", row["track_id"], e)
+            return None, usage.get("tokens", 0), f"error: {e}"
+    if emb is None:
+        # embed_text logs and swallows OpenAI errors (429s, timeouts, outages)
+        return None, usage.get("tokens", 0), "no_embedding"
+    return embedding_row(row["track_id"], row["title"], row["artist"], lyrics, emb), usage.get("tokens", 0), None
+
+
+def _record_failures(path: str, failures: list) -> None:
+    """Append failed rows to the sidecar file that retry_failed reads."""
+    if not failures:
+        return
+    with open(path, "a", encoding="utf-8") as f:
+        for row, reason in failures:
+            f.write(json.dumps(dict(row, reason=reason)) + "\n")
+
+
+def run_backfill(app, input_path: str, checkpoint_path: Optional[str] = None, workers=8,
+                 batch_size=200, price_per_1m=DEFAULT_PRICE_PER_1M, limit: Optional[int] = None,
+                 failed_path: Optional[str] = None, table=EMBEDDINGS_TABLE) -> dict:
+    """Embed every track in input_path that table doesn't have yet.
+
+    Rows are handled in batches: known track_ids are skipped with one lookup,
+    the rest go through get_lyrics + embed_text on `workers` threads, the
+    batch is written with one bulk upsert, tracks that failed are appended
+    to failed_path (default <input>.failed.jsonl) for retry_failed, then the
+    checkpoint advances. A crash loses at most the batch in flight.
+    Pointing table at a new, empty table re-embeds the whole input there
+    while the live table keeps serving; failed tracks are just absent from it.
+    Returns the checkpoint state plus finished=True once the input is exhausted."""
+    ckpt = Checkpoint(checkpoint_path or input_path + ".checkpoint.json", input_path, table)
+    failed_path = failed_path or input_path + ".failed.jsonl"
+    finished = False
+    st = ckpt.state
+    if st["rows"]:
+        log.info("backfill: resuming %s at row %d", input_path, st["rows"])
+
+    rows = islice(read_tracks(input_path), st["rows"], None)
+    t0, done_this_run, embedded_this_run, tokens_this_run = time.perf_counter(), 0, 0, 0
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while limit is None or done_this_run < limit:
+            size = batch_size if limit is None else min(batch_size, limit - done_this_run)
+            batch = list(islice(rows, size))
+            if not batch:
+                finished = True
+                break
+
+            # drop bad rows, in-file repeats and tracks already in the table
+            todo, ids = [], set()
+            for r in batch:
+                if r["track_id"] and r["title"] and r["artist"] and r["track_id"] not in ids:
+                    ids.add(r["track_id"])
+                    todo.append(r)
+            known = existing_track_ids(ids, table)
+            todo = [r for r in todo if r["track_id"] not in known]
+
+            results = list(pool.map(lambda r: _process_track(app, r), todo))
+            new_rows = [row for row, _, _ in results if row]
+            save_song_embeddings(new_rows, table)
+            _record_failures(failed_path, [(r, reason) for r, (_, _, reason) in zip(todo, results) if reason])
+
+            batch_tokens = sum(tok for _, tok, _ in results)
+            st["rows"] += len(batch)
+            st["embedded"] += len(new_rows)
+            st["skipped"] += len(batch) - len(todo)
+            st["failed"] += len(todo) - len(new_rows)
+            st["tokens"] += batch_tokens
+            ckpt.save()
+
+            done_this_run += len(batch)
+            embedded_this_run += len(new_rows)
+            tokens_this_run += batch_tokens
+            _report(st, done_this_run, embedded_this_run, tokens_this_run,
+                    time.perf_counter() - t0, price_per_1m)
+
+    return dict(st, finished=finished)
+
+
+def retry_failed(app, input_path: str, **kwargs) -> Optional[dict]:
+    """Run the tracks recorded in <input>.failed.jsonl through the backfill again.
+
+    The failed file is moved to <input>.failed.retrying.jsonl first, so tracks
+    that fail again land in a fresh <input>.failed.jsonl. An interrupted retry
+    resumes from its own checkpoint. Returns None if there is nothing to retry."""
+    _, failed, retrying, retrying_ckpt = _progress_files(input_path)
+    if not os.path.exists(retrying):
+        if not os.path.exists(failed):
+            log.info("backfill: no failed tracks recorded for %s", input_path)
+            return None
+        os.replace(failed, retrying)
+
+    st = run_backfill(app, retrying, failed_path=failed, **kwargs)
+    if st["finished"]:
+        os.remove(retrying)
+        os.remove(retrying_ckpt)
+    return st
+
+
+def _report(st: dict, done: int, embedded: int, tokens: int, elapsed: float, price_per_1m: float) -> None:
+    per_min = 60 * done / elapsed if elapsed else 0.0
+    # all tokens billed this run, failed attempts included, over what got stored
+    cost_per_1k = (tokens / 1e6 * price_per_1m) * 1000 / embedded if embedded else 0.0
+    log.info(
+        "backfill: rows=%d embedded=%d skipped=%d failed=%d | %.0f rows/min | "
+        "%.0f tokens/embedded track | $%.4f per 1k embedded tracks",
+        st["rows"], st["embedded"], st["skipped"], st["failed"], per_min,
+        tokens / max(embedded, 1), cost_per_1k,
+    )
@@ -0,0 +1,54 @@
+import os
+import threading
+from flask import current_app
+
+# Heavy clients are built on first use so worker boot stays cheap.
+_lock = threading.Lock()
+
+
+def _get_or_create(key, factory):
+    """Return app.config[key], building it once with factory() if missing."""
+    client = current_app.config.get(key)
+    if client is not None:
+        return client
+    with _lock:
+        client = current_app.config.get(key)
+        if client is None:
+            client = factory()
+            current_app.config[key] = client
+    return client
+
+
+def _build_sp_oauth():
+    from spotipy.oauth2 import SpotifyOAuth
+    from ..config import SCOPE, CLIENT_ID, CLIENT_SECRET, REDIRECT_URI
+
+    return SpotifyOAuth(
+        client_id=CLIENT_ID,
+        client_secret=CLIENT_SECRET,
+        redirect_uri=REDIRECT_URI,
+        scope=SCOPE,
+        cache_path=None,
+        cache_handler=None,
+        show_dialog=True,
+    )
+
+
+def _build_openai_client():
+    from openai import OpenAI
+
+    openai_key = os.getenv("OPENAI_API_KEY")
+    if not openai_key:
+        # This will show up in your terminal / logs if the key is missing
+        print("⚠️ OPENAI_API_KEY is not set! Embeddings will fail.")
+    return OpenAI(api_key=openai_key)
+
+
+def get_sp_oauth():
+    """Spotify OAuth helper for the current app, created on first use."""
+    return _get_or_create("SP_OAUTH", _build_sp_oauth)
+
+
+def get_openai_client():
+    """OpenAI client for the current app, created on first use."""
+    return _get_or_create("OPENAI_CLIENT", _build_openai_client)
@@ -0,0 +1,175 @@
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Hashable, Iterator, Optional
+
+from .local_db import connect, ensure_private_file
+
+log = logging.getLogger("playlistgen")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS coalesced_results (
+    key          TEXT PRIMARY KEY,
+    result       TEXT,
+    expires_at   REAL NOT NULL DEFAULT 0,
+    lease_until  REAL NOT NULL DEFAULT 0
+)
+"""
+
+# Empty results are shared with whoever was waiting, but not kept for long
+EMPTY_RESULT_TTL = 30
+
+
+class KeyedLocks:
+    """One lock per key, dropped again once nobody holds or waits on it,
+    so long-lived workers don't keep a lock for every key ever seen."""
+
+    def __init__(self):
+        self._guard = threading.Lock()
+        self._locks: dict = {}   # key -> [lock, holders + waiters]
+
+    @contextmanager
+    def hold(self, key: Hashable, timeout: float = -1) -> Iterator[bool]:
+        """Acquire the key's lock; yields False if timeout ran out first."""
+        with self._guard:
+            entry = self._locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        acquired = entry[0].acquire(timeout=timeout)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                entry[0].release()
+            with self._guard:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._locks[key]
+
+
+class SingleFlight:
+    """Collapse concurrent calls with the same key into one computation
+    across every thread and gunicorn worker on the host, and keep
+    successful results for `ttl` seconds.
+
+    The first caller claims a short lease row in a shared SQLite file and
+    runs fn(), renewing the lease from a heartbeat thread; callers in other
+    workers poll until the result row appears. If the leader raises, its
+    lease is released; if its worker is killed, the heartbeat stops and the
+    lease lapses within lease_seconds, and the next waiter takes over.
+    A waiter that has waited wait_seconds gives up and runs fn() itself.
+    Results must be JSON-serializable."""
+
+    def __init__(self, path: str, ttl: float, lease_seconds: float = 30,
+                 wait_seconds: float = 120, poll: float = 0.5):
+        self.path = path
+        self.ttl = ttl
+        self.lease_seconds = lease_seconds
+        self.wait_seconds = wait_seconds
+        self.poll = poll
+        self._locks = KeyedLocks()
+        ensure_private_file(path)
+        with connect(path) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(_SCHEMA)
+
+    def _cached(self, key: str):
+        """Return (True, value) for a live result row, else (False, None)."""
+        with connect(self.path) as conn:
+            row = conn.execute(
+                "SELECT result FROM coalesced_results "
+                "WHERE key = ? AND result IS NOT NULL AND expires_at > ?",
+                (key, time.time()),
+            ).fetchone()
+        return (True, json.loads(row[0])) if row else (False, None)
+
+    def _claim_lease(self, key: str) -> bool:
+        now = time.time()
+        with connect(self.path) as conn:
+            conn.execute("INSERT OR IGNORE INTO coalesced_results (key) VALUES (?)", (key,))
+            cur = conn.execute(
+                "UPDATE coalesced_results SET result = NULL, lease_until = ? "
+                "WHERE key = ? AND lease_until < ? AND (result IS NULL OR expires_at <= ?)",
+                (now + self.lease_seconds, key, now, now),
+            )
+            return cur.rowcount == 1
+
+    def _publish(self, key: str, value: Any) -> None:
+        now = time.time()
+        ttl = self.ttl if value is not None else min(self.ttl, EMPTY_RESULT_TTL)
+        with connect(self.path) as conn:
+            conn.execute(
+                "UPDATE coalesced_results SET result = ?, expires_at = ?, lease_until = 0 WHERE key = ?",
+                (json.dumps(value), now + ttl, key),
+            )
+            # drop long-dead rows so the file doesn't grow forever
+            conn.execute(
+                "DELETE FROM coalesced_results WHERE expires_at < ? AND lease_until < ?",
+                (now - 3600, now),
+            )
+
+    def _heartbeat(self, key: str, stop: threading.Event) -> None:
+        """Keep extending our lease until stop is set."""
+        while not stop.wait(self.lease_seconds / 3):
+            try:
+                with connect(self.path) as conn:
+                    conn.execute(
+                        "UPDATE coalesced_results SET lease_until = ? WHERE key = ? AND result IS NULL",
+                        (time.time() + self.lease_seconds, key),
+                    )
+            except Exception as e:
+                log.warning("coalesce: lease renewal failed for %s: %s", key, e)
+
+    def _run_as_leader(self, key: str, fn: Callable[[], Any]) -> Any:
+        stop = threading.Event()
+        beat = threading.Thread(target=self._heartbeat, args=(key, stop), daemon=True)
+        beat.start()
+        try:
+            value = fn()
+        except BaseException:
+            stop.set()
+            self._release(key)
+            raise
+        stop.set()
+        self._publish(key, value)
+        return value
+
+    def _release(self, key: str) -> None:
+        with connect(self.path) as conn:
+            conn.execute("UPDATE coalesced_results SET lease_until = 0 WHERE key = ?", (key,))
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        skey = json.dumps(key, sort_keys=True)
+        deadline = time.time() + self.wait_seconds
+        # threads in this worker wait on the lock instead of polling the file
+        with self._locks.hold(skey, timeout=self.wait_seconds) as acquired:
+            if not acquired:
+                log.warning("coalesce: gave up waiting for %s, computing locally", skey)
+                return fn()
+            while True:
+                hit, value = self._cached(skey)
+                if hit:
+                    return value
+
+                if self._claim_lease(skey):
+                    return self._run_as_leader(skey, fn)
+
+                # another worker is computing it
+                if time.time() > deadline:
+                    log.warning("coalesce: gave up waiting for %s, computing locally", skey)
+                    return fn()
+                time.sleep(self.poll)
+
+
+_flights: dict = {}
+_flights_guard = threading.Lock()
+
+
+def get_single_flight(path: str, ttl: float) -> SingleFlight:
+    """Process-wide SingleFlight for a given SQLite file, opened on first use."""
+    with _flights_guard:
+        flight = _flights.get(path)
+        if flight is None:
+            flight = _flights[path] = SingleFlight(path, ttl)
+        return flight
@@ -0,0 +1,34 @@
+import os
+import sqlite3
+import stat
+from contextlib import closing, contextmanager
+from typing import Iterator
+
+from flask import current_app
+
+
+def default_db_path(filename: str) -> str:
+    """Path for a worker-shared SQLite file inside the app's instance folder."""
+    os.makedirs(current_app.instance_path, mode=0o700, exist_ok=True)
+    return os.path.join(current_app.instance_path, filename)
+
+
+def ensure_private_file(path: str) -> None:
+    """Create path readable by this user only, or check that an existing one is.
+    SQLite creates its -wal/-shm files with the same mode as the database."""
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        st = os.fstat(fd)
+        if st.st_uid != os.getuid():
+            raise PermissionError(f"{path} is owned by uid {st.st_uid}, not us")
+        if stat.S_IMODE(st.st_mode) & 0o077:
+            os.fchmod(fd, 0o600)
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def connect(path: str) -> Iterator[sqlite3.Connection]:
+    # autocommit; each statement is its own transaction
+    with closing(sqlite3.connect(path, timeout=10, isolation_level=None)) as conn:
+        yield conn
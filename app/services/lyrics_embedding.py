@@ -1,73 +1,142 @@
-import numpy as np
 from flask import current_app
-from app.services.supabase_db import SUPABASE_ANON, SUPABASE_ADMIN
+from app.services.supabase_db import get_supabase_anon, get_supabase_admin
+from app.services.clients import get_openai_client
+from app.services.lyrics_preprocess import preprocess_lyrics
+from app.config import EMBEDDING_DIMENSIONS, EMBEDDINGS_TABLE, LYRICS_PREPROCESS, MATCH_RPC
 import traceback
 
-def embed_text(lyrics_text, max_chunk_chars=20000):
-    """Embed lyrics into a single vector via OpenAI."""
+def embed_text(lyrics_text, max_chunk_chars=20000, usage=None, preprocess=LYRICS_PREPROCESS,
+               max_chunk_tokens=512, dimensions=EMBEDDING_DIMENSIONS):
+    """Embed lyrics into a single vector via OpenAI.
+
+    With preprocess=True the lyrics go through lyrics_preprocess first:
+    noise is stripped, repeated stanzas are embedded once and weighted by
+    occurrence, and chunks follow stanza boundaries up to max_chunk_tokens.
+    preprocess=False keeps the old fixed max_chunk_chars slices; the default
+    comes from the LYRICS_PREPROCESS setting.
+    If a `usage` dict is passed, billed tokens are added to usage["tokens"]."""
     if not lyrics_text or len(lyrics_text) < 50:
         return None
     
-    client = current_app.config.get("OPENAI_CLIENT")
+    client = get_openai_client()
     if client is None:
         current_app.logger.error("OPENAI_CLIENT is not configured on the app.")
         return None
 
-    chunks = [
-        lyrics_text[i:i + max_chunk_chars]
-        for i in range(0, len(lyrics_text), max_chunk_chars)
-    ]
-
-    vecs = []
-    for ch in chunks:
-        try:
-            resp = client.embeddings.create(
-                input=ch,
-                model="text-embedding-3-small",
-            )
-            vecs.append(resp.data[0].embedding)
-        except Exception as e:
-            current_app.logger.error(f"Error generating embedding for chunk: {e}")
-            traceback.print_exc()
-            continue
+    if preprocess:
+        segments = preprocess_lyrics(lyrics_text, max_tokens=max_chunk_tokens)
+        chunks = [seg.text for seg in segments]
+        weights = [seg.weight for seg in segments]
+    else:
+        chunks = [
+            lyrics_text[i:i + max_chunk_chars]
+            for i in range(0, len(lyrics_text), max_chunk_chars)
+        ]
+        weights = [1.0] * len(chunks)
+    if not chunks:
+        return None
+
+    extra = {"dimensions": dimensions} if dimensions else {}
+    try:
+        # one request for all chunks of the song
+        resp = client.embeddings.create(
+            input=chunks,
+            model="text-embedding-3-small",
+            **extra,
+        )
+    except Exception as e:
+        current_app.logger.error(f"Error generating embedding: {e}")
+        traceback.print_exc()
+        return None
+
+    if usage is not None and getattr(resp, "usage", None):
+        usage["tokens"] = usage.get("tokens", 0) + resp.usage.total_tokens
 
+    vecs = [d.embedding for d in sorted(resp.data, key=lambda d: d.index)]
     if not vecs:
         return None
 
-    # Average all chunk vectors into a single embedding
-    return np.mean(np.array(vecs), axis=0).tolist()
+    import numpy as np
+
+    # Weighted average of the chunk vectors into a single embedding
+    return np.average(np.array(vecs), axis=0, weights=weights).tolist()
 
 
 def find_similar_songs(query_embedding, top_n=10):
     """Vector search via RPC (read-only client)."""
     return (
-        SUPABASE_ANON
-        .rpc("match_lyrics_similarity", {"query_embedding": query_embedding, "match_count": top_n})
+        get_supabase_anon()
+        .rpc(MATCH_RPC, {"query_embedding": query_embedding, "match_count": top_n})
         .execute()
         .data
     )
 
 
+def iter_similar_songs(query_embedding, first_page=100, max_candidates=5000):
+    """Yield pages of similarity matches, best first, for as long as the caller
+    keeps iterating. The match RPC only takes match_count, so each
+    page re-asks for twice as many rows and yields just the new tail."""
+    seen, count = 0, min(first_page, max_candidates)
+    while True:
+        rows = find_similar_songs(query_embedding, top_n=count) or []
+        if len(rows) > seen:
+            yield rows[seen:]
+        # catalog exhausted or cap reached
+        if len(rows) < count or count >= max_candidates:
+            return
+        seen, count = len(rows), min(count * 2, max_candidates)
+
+
+def embedding_row(track_id, track_name, artist_name, lyrics, embedding):
+    snippet = (lyrics or "")[:240] if lyrics else None
+    return {
+        "track_id": track_id,
+        "track_name": track_name,
+        "artist_name": artist_name,
+        "lyrics": snippet,
+        "embedding": embedding,
+    }
+
+
 def save_song_embedding(track_id, track_name, artist_name, lyrics, embedding):
     """Upsert embedding with the admin client."""
     if not embedding:
         return
 
-    if SUPABASE_ADMIN is None:
+    save_song_embeddings([embedding_row(track_id, track_name, artist_name, lyrics, embedding)])
+
+
+def save_song_embeddings(rows, table=EMBEDDINGS_TABLE):
+    """Bulk upsert rows built by embedding_row in a single request."""
+    if not rows:
+        return
+
+    admin = get_supabase_admin()
+    if admin is None:
         raise RuntimeError("SUPABASE_SERVICE_ROLE_KEY not configured on server")
 
-    snippet = (lyrics or "")[:240] if lyrics else None
+    admin.table(table).upsert(rows, on_conflict=["track_id"]).execute()
+
 
-    SUPABASE_ADMIN.table("song_embeddings").upsert(
-        {
-            "track_id": track_id,
-            "track_name": track_name,
-            "artist_name": artist_name,
-            "lyrics": snippet,
-            "embedding": embedding,
-        },
-        on_conflict=["track_id"],
-    ).execute()
+def existing_track_ids(track_ids, table=EMBEDDINGS_TABLE):
+    """Return the subset of track_ids that already have an embedding in table."""
+    if not track_ids:
+        return set()
+
+    # same client the writes go through, so RLS can't hide rows from us
+    admin = get_supabase_admin()
+    if admin is None:
+        raise RuntimeError("SUPABASE_SERVICE_ROLE_KEY not configured on server")
+
+    rows = (
+        admin
+        .table(table)
+        .select("track_id")
+        .in_("track_id", list(track_ids))
+        .execute()
+        .data
+    )
+    return {r["track_id"] for r in rows or []}
 
 
 def generate_and_store_embedding(track_id, track_name, artist_name, lyrics_text):
@@ -1,7 +1,7 @@
 import re, unicodedata, requests, logging
-from bs4 import BeautifulSoup
 from flask import current_app
 from typing import Optional
+from ..config import LYRICS_PREPROCESS
 
 log = logging.getLogger("playlistgen")
 
@@ -154,10 +154,23 @@ def scrape_lyrics_from_genius(url: str) -> Optional[str]:
 
     return None
 
+def _tidy_whitespace(text: str) -> str:
+    """Collapse whitespace runs to newlines, as the stored catalog was built.
+    With LYRICS_PREPROCESS on, squeeze spaces and blank-line runs but keep
+    one blank line between stanzas; lyrics_preprocess uses those as stanza
+    boundaries."""
+    if not LYRICS_PREPROCESS:
+        return re.sub(r"\s{2,}", "\n", text).strip()
+    text = re.sub(r"[ \t]{2,}", " ", text)
+    text = re.sub(r"[ \t]*\n[ \t]*", "\n", text)
+    text = re.sub(r"\n{3,}", "\n\n", text)
+    return text.strip()
+
 def _extract_lyrics_from_html(html: str) -> Optional[str]:
     """Pull text from <div data-lyrics-container> blocks and clean structure markers."""
     if not html:
         return None
+    from bs4 import BeautifulSoup
     soup = BeautifulSoup(html, "html.parser")
     blocks = soup.find_all("div", {"data-lyrics-container": "true"}) \
              or soup.select("div[class^='Lyrics__Container']")
@@ -167,7 +180,7 @@ def _extract_lyrics_from_html(html: str) -> Optional[str]:
     if m:
         text = text[m.start():]
     text = re.sub(r"\[.*?\]", "", text)
-    text = re.sub(r"\s{2,}", "\n", text).strip()
+    text = _tidy_whitespace(text)
     return text if len(text.split()) >= 10 else None
 
 def _slice_lyrics_like_section(txt: str) -> Optional[str]:
@@ -184,7 +197,7 @@ def _slice_lyrics_like_section(txt: str) -> Optional[str]:
     chunk = txt[start:]
     chunk = re.split(r"\b(You might also like|Embed|More on Genius)\b", chunk, maxsplit=1, flags=re.I)[0]
     chunk = re.sub(r"\[.*?\]", "", chunk)
-    chunk = re.sub(r"\s{2,}", "\n", chunk).strip()
+    chunk = _tidy_whitespace(chunk)
     return chunk if len(chunk.split()) >= 10 else None
 
 
@@ -0,0 +1,184 @@
+import re
+import unicodedata
+from functools import lru_cache
+from typing import List, NamedTuple, Tuple
+
+# Scraped-page leftovers that survive _extract_lyrics_from_html / the proxy fallback
+NOISE_RES = [
+    re.compile(p, re.I) for p in (
+        # Genius runs the header together: "12 ContributorsTranslationsEspañol..."
+        r"^\d*\s*contributors?",
+        r"^translations?",
+        r"^you might also like",
+        r"^see .{0,80} live$",
+        r"^get tickets as low as",
+        r"^\d*\s*embed$",
+        r"^(title|url source|markdown content|published time):",  # r.jina.ai header
+        r"^read more\b",
+        r"^https?://\S+$",
+    )
+]
+# Page header lines, only checked before the first lyric line:
+# "Song Title Lyrics" and the song description blurb ending in "Read More"
+HEADER_RES = [
+    re.compile(r"^.{0,120}\blyrics$", re.I),
+    re.compile(r"\bread more\s*$", re.I),
+]
+# Inline junk stripped from otherwise good lines
+INLINE_RES = [
+    (re.compile(r"!?\[[^\]]*\]\([^)]*\)"), ""),   # markdown links/images from the proxy
+    (re.compile(r"\[[^\]]*\]"), ""),              # leftover [Chorus] style markers
+    (re.compile(r"\d*Embed$"), ""),                # "...last line42Embed"
+    (re.compile(r"[ \t]+"), " "),
+]
+
+
+class Segment(NamedTuple):
+    text: str
+    weight: float   # occurrence-weighted token mass this text stands for
+    tokens: int     # tokens actually sent for it
+
+
+@lru_cache(maxsize=1)
+def _encoder():
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    # encoding used by the text-embedding-3 models
+    return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text: str) -> int:
+    """Token count for the embedding model; ~4 chars/token if tiktoken is missing."""
+    if not text:
+        return 0
+    enc = _encoder()
+    if enc is None:
+        return max(1, len(text) // 4)
+    return len(enc.encode(text))
+
+
+def _line_key(line: str) -> str:
+    """Comparison key so case/punctuation-only variants count as repeats."""
+    return re.sub(r"[^\w\s]", "", line.lower()).strip()
+
+
+def clean_lines(text: str) -> List[Tuple[str, int]]:
+    """Normalize the text and drop noise lines. Back-to-back repeats are
+    merged into one (line, repeats) entry; ("", 0) marks a stanza break.
+
+    >>> clean_lines("12 ContributorsTranslationsEspañolDeutschBlinding Lights Lyrics\\n"
+    ...             "Blinding Lights Lyrics\\nI've been tryna call\\nI've been tryna call\\n"
+    ...             "I wanna read more")
+    [("I've been tryna call", 2), ('I wanna read more', 1)]
+    """
+    text = unicodedata.normalize("NFKC", text or "").replace("’", "'")
+    out = []
+    for raw in text.splitlines():
+        line = raw.strip()
+        for rx, repl in INLINE_RES:
+            line = rx.sub(repl, line).strip()
+        if line and any(rx.search(line) for rx in NOISE_RES):
+            continue
+        if line and not out and any(rx.search(line) for rx in HEADER_RES):
+            continue
+        # collapse back-to-back duplicates ("yeah / yeah / yeah") into a count
+        if line and out and out[-1][0] and _line_key(out[-1][0]) == _line_key(line):
+            out[-1] = (out[-1][0], out[-1][1] + 1)
+            continue
+        if line:
+            out.append((line, 1))
+        elif out and out[-1][0]:
+            out.append(("", 0))
+    while out and not out[-1][0]:
+        out.pop()
+    return out
+
+
+def collapse_stanzas(lines: List[Tuple[str, int]]) -> List[tuple]:
+    """Group lines into stanzas and keep each distinct stanza once.
+    Lines already sung in an earlier stanza are dropped from later ones;
+    every kept line carries how often it is sung across the whole song.
+    Returns [([(line, occurrences), ...], stanza_occurrences)] in first-seen order.
+
+    >>> collapse_stanzas([("Chorus x", 1), ("Chorus y", 1), ("Chorus x", 1), ("Chorus y", 1)])
+    [([('Chorus x', 2), ('Chorus y', 2)], 1)]
+    """
+    stanzas, cur = [], []
+    for line, repeats in lines + [("", 0)]:
+        if line:
+            cur.append((line, repeats))
+        elif cur:
+            stanzas.append(cur)
+            cur = []
+
+    line_totals = {}
+    for st in stanzas:
+        for line, repeats in st:
+            key = _line_key(line)
+            line_totals[key] = line_totals.get(key, 0) + repeats
+
+    order, counts, seen_lines = [], {}, set()
+    for st in stanzas:
+        key = tuple(_line_key(l) for l, _ in st)
+        if key in counts:
+            counts[key][1] += 1
+            continue
+        # each line is sent once per song, even if it recurs within this stanza
+        fresh = []
+        for l, _ in st:
+            lk = _line_key(l)
+            if lk not in seen_lines:
+                seen_lines.add(lk)
+                fresh.append((l, line_totals[lk]))
+        counts[key] = [fresh, 1]
+        order.append(key)
+    return [tuple(counts[k]) for k in order if counts[k][0]]
+
+
+def preprocess_lyrics(text: str, max_tokens: int = 512) -> List[Segment]:
+    """Turn raw scraped lyrics into embedding inputs.
+
+    Each distinct line is sent once and weighted by how often it is sung.
+    Stanzas containing repeats (choruses, hooks) become their own segment so
+    the weight matters; one-off stanzas are packed together up to max_tokens
+    without splitting a stanza unless it is longer than that."""
+    segments, pack, pack_tokens, pack_weight = [], [], 0, 0.0
+
+    def flush():
+        nonlocal pack, pack_tokens, pack_weight
+        if pack:
+            segments.append(Segment("\n\n".join(pack), pack_weight, pack_tokens))
+            pack, pack_tokens, pack_weight = [], 0, 0.0
+
+    for stanza, _ in collapse_stanzas(clean_lines(text)):
+        for part in _split_long(stanza, max_tokens):
+            part_text = "\n".join(line for line, _ in part)
+            n = count_tokens(part_text)
+            weight = float(sum(count_tokens(line) * occ for line, occ in part))
+            if any(occ > 1 for _, occ in part):
+                segments.append(Segment(part_text, weight, n))
+                continue
+            if pack_tokens + n > max_tokens:
+                flush()
+            pack.append(part_text)
+            pack_tokens += n
+            pack_weight += weight
+    flush()
+    return segments
+
+
+def _split_long(stanza: List[Tuple[str, int]], max_tokens: int) -> List[List[Tuple[str, int]]]:
+    """Split a stanza on line boundaries if it alone exceeds max_tokens."""
+    parts, cur, cur_tokens = [], [], 0
+    for line, occ in stanza:
+        n = count_tokens(line)
+        if cur and cur_tokens + n > max_tokens:
+            parts.append(cur)
+            cur, cur_tokens = [], 0
+        cur.append((line, occ))
+        cur_tokens += n
+    if cur:
+        parts.append(cur)
+    return parts
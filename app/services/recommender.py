@@ -1,24 +1,112 @@
+import os
 import time
 import numpy as np
 import logging
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 import requests
 from spotipy import Spotify
 from spotipy.exceptions import SpotifyException
-from flask import session
-from .spotify_api import get_artist_from_playlist
+from .spotify_api import get_artist_from_playlist, add_tracks_in_chunks, current_spotify_id
 from .lyrics_getter import get_lyrics 
-from .lyrics_embedding import generate_and_store_embedding, find_similar_songs
-from .supabase_db import SUPABASE_ADMIN
+from .lyrics_embedding import generate_and_store_embedding, iter_similar_songs
+from .supabase_db import get_supabase_admin
 from .utils import is_duplicate_song 
+from .coalesce import get_single_flight
+from .local_db import default_db_path
+from ..config import DEFAULT_TRACK_COUNT, MAX_TRACK_COUNT
 
 log = logging.getLogger("playlistgen")
 
-def generate_playlist_from_seed(sp: Spotify, access_token: str, playlist_id: str, playlist_name="Generated Mix"):
-    """Generate a new playlist based on the lyrical similarity of an existing one."""
+def _recommendations():
+    """Recommendation lists shared by all workers, keyed by
+    (seed playlist, snapshot_id, options). Lives at GENERATION_CACHE_PATH
+    (defaults to the app's instance folder)."""
+    path = os.getenv("GENERATION_CACHE_PATH") or default_db_path("generation_cache.sqlite3")
+    return get_single_flight(path, ttl=float(os.getenv("GENERATION_CACHE_TTL", "600")))
+
+# Parallel Spotify searches per generation, submitted RESOLVE_BATCH at a time
+RESOLVE_WORKERS = 8
+RESOLVE_BATCH = 50
+
+def _search_track(sp: Spotify, cand_title: str, cand_artist: str):
+    """Look a catalog row up on Spotify; returns the top track item or None."""
+    q = f"track:{cand_title} artist:{cand_artist}"
+
+    try:
+        # exact match
+        resp = sp.search(q=q, type="track", limit=1)
+        items = resp.get("tracks", {}).get("items", [])
+
+        # title-only search
+        if not items and cand_title:
+            resp = sp.search(q=cand_title, type="track", limit=1)
+            items = resp.get("tracks", {}).get("items", [])
+
+    except SpotifyException as e:
+        log.error("gen: Spotify API error during search for '%s — %s': %s", cand_artist, cand_title, e)
+        traceback.print_exc()
+        return None
+    except requests.exceptions.RequestException as e:
+        log.error("gen: network error calling Spotify for '%s — %s': %s", cand_artist, cand_title, e)
+        traceback.print_exc()
+        return None
+    except Exception as e:
+        log.error("gen: unexpected error during Spotify search for '%s — %s': %s", cand_artist, cand_title, e)
+        traceback.print_exc()
+        return None
+
+    if not items:
+        log.info("gen: no Spotify results | %s — %s", cand_artist, cand_title)
+        return None
+    return items[0]
+
+def _log_resolved(track_uris, t0):
+    elapsed = time.perf_counter() - t0
+    log.info("gen: resolved | count=%d in %.1fs (%.0f ms per 100 tracks)",
+             len(track_uris), elapsed, 100000 * elapsed / max(len(track_uris), 1))
+    return track_uris
+
+def resolve_candidates(sp: Spotify, pages, limit: int, added_sigs: set, workers=RESOLVE_WORKERS):
+    """Resolve pages of similarity matches to Spotify URIs, in similarity order,
+    until `limit` URIs are collected. Searches within a page run in parallel;
+    pages are only fetched while more tracks are needed."""
     t0 = time.perf_counter()
-    spotify_id = session.get("spotify_id")
-    log.info("gen: start | pid=%s name=%s", playlist_id, playlist_name)
+    track_uris, seen_uris = [], set()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for page in pages:
+            todo = []
+            for s in page:
+                cand_title = s.get("track_name") or ""
+                cand_artist = s.get("artist_name") or ""
+                if is_duplicate_song(cand_title, cand_artist, added_sigs, threshold=0.90):
+                    log.info("gen: skip duplicate rec | %s — %s", cand_artist, cand_title)
+                    continue
+                todo.append((cand_title, cand_artist))
+
+            # small batches so we stop searching soon after hitting the limit
+            for b in range(0, len(todo), RESOLVE_BATCH):
+                batch = todo[b:b + RESOLVE_BATCH]
+                found = pool.map(lambda c: _search_track(sp, *c), batch)
+                for (cand_title, cand_artist), item in zip(batch, found):
+                    if item is None:
+                        continue
+                    # two variants in the same batch may both have been searched
+                    if item["uri"] in seen_uris or is_duplicate_song(cand_title, cand_artist, added_sigs, threshold=0.90):
+                        continue
+                    seen_uris.add(item["uri"])
+                    track_uris.append(item["uri"])
+                    added_sigs.add(f"{cand_artist}:{cand_title}")
+                if len(track_uris) >= limit:
+                    return _log_resolved(track_uris[:limit], t0)
+
+    return _log_resolved(track_uris, t0)
+
+def recommend_from_seed(sp: Spotify, access_token: str, playlist_id: str, track_count=DEFAULT_TRACK_COUNT):
+    """Run the lyrics => embedding => vector search pipeline for a seed playlist.
+    Returns the recommended URIs plus seed metadata, or None if nothing could be embedded.
+    The result is shared between users, so it must not depend on the session."""
+    log.info("gen: recommend | pid=%s track_count=%d", playlist_id, track_count)
 
    # Pull all tracks and primary artists from the seed playlist
     seed_artists, seed_ids, track_ids, track_names = get_artist_from_playlist(access_token, playlist_id)
@@ -56,71 +144,67 @@ def generate_playlist_from_seed(sp: Spotify, access_token: str, playlist_id: str
     # Average seed embeddings => overall "playlist mood" vector
     playlist_vec = list(np.mean(np.array(embeddings), axis=0))
 
-    # Vector search for lyrically similar songs
-    similar_songs = find_similar_songs(playlist_vec, top_n=50) or []
-    log.info("gen: similar_songs | count=%d", len(similar_songs))
+    # Vector search for lyrically similar songs, paged so large mixes get enough
+    # candidates; oversample since duplicates and unresolved tracks drop out
+    pages = iter_similar_songs(playlist_vec, first_page=max(2 * track_count, 50))
 
     # Resolve matches to Spotify URIs while avoiding duplicates or variants
-    track_uris, added_sigs = [], set(seed_artists[i] + ":" + track_names[i] for i in range(len(track_ids)))
-    for s in similar_songs:
-        cand_title = s.get("track_name") or ""
-        cand_artist = s.get("artist_name") or ""
-        if is_duplicate_song(cand_title, cand_artist, added_sigs, threshold=0.90):
-            log.info("gen: skip duplicate rec | %s — %s", cand_artist, cand_title)
-            continue
+    added_sigs = set(seed_artists[i] + ":" + track_names[i] for i in range(len(track_ids)))
+    track_uris = resolve_candidates(sp, pages, track_count, added_sigs)
 
-        q = f"track:{cand_title} artist:{cand_artist}"
-
-        try:
-            # exact match
-            resp = sp.search(q=q, type="track", limit=1)
-            items = resp.get("tracks", {}).get("items", [])
-
-            # title-only search
-            if not items and cand_title:
-                resp = sp.search(q=cand_title, type="track", limit=1)
-                items = resp.get("tracks", {}).get("items", [])
-
-        except SpotifyException as e:
-            log.error("gen: Spotify API error during search for '%s — %s': %s", cand_artist, cand_title, e)
-            traceback.print_exc()
-            continue
-        except requests.exceptions.RequestException as e:
-            log.error("gen: network error calling Spotify for '%s — %s': %s", cand_artist, cand_title, e)
-            traceback.print_exc()
-            continue
-        except Exception as e:
-            log.error("gen: unexpected error during Spotify search for '%s — %s': %s", cand_artist, cand_title, e)
-            traceback.print_exc()
-            continue
-
-        if not items:
-            log.info("gen: no Spotify results | %s — %s", cand_artist, cand_title)
-            continue
+    log.info("gen: candidate uris | count=%d", len(track_uris))
 
-        tid2 = items[0]["id"]
-        uri  = items[0]["uri"]
-        track_uris.append(uri)
-        added_sigs.add(f"{cand_artist}:{cand_title}")
+    return {
+        "track_uris": list(track_uris),
+        "seed_ids": list(seed_ids),
+        "seed_artists": list(seed_artists),
+        "embedded": len(embeddings),
+    }
+
+def generate_playlist_from_seed(sp: Spotify, access_token: str, playlist_id: str, playlist_name="Generated Mix",
+                                track_count=DEFAULT_TRACK_COUNT):
+    """Generate a new playlist based on the lyrical similarity of an existing one.
+    Concurrent generations from the same seed share one recommendation run;
+    only the playlist creation below is done per user."""
+    spotify_id = current_spotify_id()
+    log.info("gen: start | pid=%s name=%s", playlist_id, playlist_name)
 
-    log.info("gen: candidate uris | count=%d", len(track_uris))
+    # snapshot_id changes whenever the seed playlist is edited
+    try:
+        snapshot_id = (sp.playlist(playlist_id, fields="snapshot_id") or {}).get("snapshot_id")
+    except Exception as e:
+        log.warning("gen: snapshot lookup failed for %s: %s", playlist_id, e)
+        snapshot_id = None
+
+    track_count = max(1, min(int(track_count or DEFAULT_TRACK_COUNT), MAX_TRACK_COUNT))
+    compute = lambda: recommend_from_seed(sp, access_token, playlist_id, track_count=track_count)
+    if snapshot_id:
+        key = [playlist_id, snapshot_id, {"track_count": track_count}]
+        recs = _recommendations().do(key, compute)
+    else:
+        # without a snapshot we can't tell whether a cached list is still current
+        recs = compute()
+    if not recs:
+        return None
+    track_uris = recs["track_uris"]
+    seed_ids, seed_artists = recs["seed_ids"], recs["seed_artists"]
 
-    # Create the new playlist and add up to 100 recommended tracks
+    # Create the new playlist and add the recommended tracks in order
     user_id = spotify_id or sp.current_user().get("id")
     new_playlist = sp.user_playlist_create(user=user_id, name=playlist_name, public=False,
                                            description="Lyrics-aware mix seeded from your playlist")
     added = 0
     if track_uris:
-        sp.playlist_add_items(new_playlist["id"], track_uris[:100])
-        added = min(len(track_uris), 100)
+        added, _ = add_tracks_in_chunks(sp, new_playlist["id"], track_uris)
     log.info("gen: created | id=%s added=%d", new_playlist["id"], added)
 
     # Optionally persist metadata to Supabase
     try:
-        if SUPABASE_ADMIN:
-            user_row = SUPABASE_ADMIN.table("users").select("id").eq("spotify_id", user_id).execute()
+        admin = get_supabase_admin()
+        if admin:
+            user_row = admin.table("users").select("id").eq("spotify_id", user_id).execute()
             uid = user_row.data[0]["id"] if user_row.data else None
-            SUPABASE_ADMIN.table("playlists").insert({
+            admin.table("playlists").insert({
                 "user_id": uid,
                 "name": new_playlist["name"],
                 "spotify_playlist_id": new_playlist["id"],
@@ -130,6 +214,6 @@ def generate_playlist_from_seed(sp: Spotify, access_token: str, playlist_id: str
     except Exception as e:
         log.warning("gen: supabase insert failed: %s", e)
 
-    log.info("gen: embedded | total=%d", len(embeddings))
+    log.info("gen: embedded | total=%d", recs["embedded"])
 
     return {"id": new_playlist["id"], "added": added}
\ No newline at end of file
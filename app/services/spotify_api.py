@@ -1,22 +1,42 @@
-from spotipy import Spotify
-from flask import current_app, session
+import logging
+import time
+from typing import TYPE_CHECKING
+from flask import session
 import requests
+from .clients import get_sp_oauth
+from .token_store import get_token_store
+
+log = logging.getLogger("playlistgen")
+
+if TYPE_CHECKING:
+    from spotipy import Spotify
+
+def current_spotify_id():
+    """spotify_id of the logged-in user, resolved from the session's login
+    handle through the token store. None if not logged in."""
+    return get_token_store().resolve_login(session.get("login"))
 
 def ensure_spotify():
     """Return an authenticated Spotify client and access token
-    for the current Flask session. Refreshes the token if needed."""
-    sp_oauth = current_app.config["SP_OAUTH"]
-    if "token_info" not in session:
+    for the current Flask session. Tokens live in the shared token
+    store, which refreshes them once per expiry across workers."""
+    spotify_id = current_spotify_id()
+    if not spotify_id:
         return None, None
 
-    token_info = session["token_info"]
-     # Refresh if the current token has expired
-    if sp_oauth.is_token_expired(token_info):
-        token_info = sp_oauth.refresh_access_token(token_info["refresh_token"])
-        session["token_info"] = token_info
+    store = get_token_store()
+    sp_oauth = get_sp_oauth()
+    try:
+        token_info = store.get_fresh(spotify_id, sp_oauth.refresh_access_token)
+    except Exception as e:
+        log.warning("tokens: refresh failed for %s: %s", spotify_id, e)
+        return None, None
+    if not token_info:
+        return None, None
 
     access_token = token_info["access_token"]
 
+    from spotipy import Spotify
     sp = Spotify(
         auth=access_token,
         requests_timeout=10,   
@@ -24,7 +44,7 @@ def ensure_spotify():
     )
     return sp, access_token
 
-def collect_meta_by_id(sp: Spotify, playlist_id: str) -> dict:
+def collect_meta_by_id(sp: "Spotify", playlist_id: str) -> dict:
     """Collect track metadata (name, artist, URI) from a playlist
     and return a lookup dict keyed by track ID."""
     tracks = []
@@ -70,4 +90,50 @@ def get_artist_from_playlist(access_token, playlist_id):
             track_ids.append(tid)
             track_names.append(tname)
         url = resp.get("next")
-    return artist_names, artist_ids, track_ids, track_names
\ No newline at end of file
+    return artist_names, artist_ids, track_ids, track_names
+
+def _add_chunk(sp: "Spotify", playlist_id: str, chunk: list, position: int, retries: int, backoff: float):
+    """Write one chunk at a fixed position, retrying on failure.
+    Returns (ok, snapshot_id); snapshot_id may be None even when ok."""
+    for attempt in range(retries + 1):
+        try:
+            resp = sp.playlist_add_items(playlist_id, chunk, position=position)
+            return True, (resp or {}).get("snapshot_id")
+        except Exception as e:
+            log.warning("playlist: add at %d failed (attempt %d/%d): %s",
+                        position, attempt + 1, retries + 1, e)
+        if attempt == retries:
+            return False, None
+        time.sleep(backoff * 2 ** attempt)
+        # the write may have landed even though we never saw the response
+        try:
+            state = sp.playlist(playlist_id, fields="snapshot_id,tracks.total") or {}
+            if (state.get("tracks") or {}).get("total", 0) >= position + len(chunk):
+                return True, state.get("snapshot_id")
+        except Exception as e:
+            log.warning("playlist: state check failed for %s: %s", playlist_id, e)
+    return False, None
+
+def add_tracks_in_chunks(sp: "Spotify", playlist_id: str, uris, chunk_size=100, retries=3, offset=0,
+                         backoff=1.0):
+    """Append uris to a playlist in order, chunk_size per request (the API max).
+    Every chunk is written at an explicit position starting at `offset`, so a
+    retried chunk still lands in its slot. Stops at the first chunk that keeps
+    failing, since later positions would no longer line up.
+    Returns (number of tracks added, final snapshot_id)."""
+    t0 = time.perf_counter()
+    added, snapshot_id = 0, None
+    for start in range(0, len(uris), chunk_size):
+        chunk = list(uris[start:start + chunk_size])
+        ok, new_snapshot = _add_chunk(sp, playlist_id, chunk, offset + start, retries, backoff)
+        if not ok:
+            log.error("playlist: giving up on %s at position %d", playlist_id, offset + start)
+            break
+        snapshot_id = new_snapshot or snapshot_id
+        added += len(chunk)
+        log.info("playlist: added %d/%d | snapshot=%s", added, len(uris), snapshot_id)
+
+    elapsed = time.perf_counter() - t0
+    log.info("playlist: wrote %d tracks in %.1fs (%.0f ms per 100 tracks)",
+             added, elapsed, 100000 * elapsed / max(added, 1))
+    return added, snapshot_id
@@ -1,15 +1,29 @@
 import os
-from supabase import create_client, Client
+from functools import lru_cache
+from typing import Optional, TYPE_CHECKING
 from dotenv import load_dotenv
-from typing import Optional
+
+if TYPE_CHECKING:
+    from supabase import Client
 
 load_dotenv()
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 
-# Read/search client 
-SUPABASE_ANON: Client = create_client(SUPABASE_URL, os.getenv("SUPABASE_KEY"))
 
-# Write client (SERVER ONLY)
-_service_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
-SUPABASE_ADMIN: Optional[Client] = create_client(SUPABASE_URL, _service_key) if _service_key else None
\ No newline at end of file
+@lru_cache(maxsize=None)
+def get_supabase_anon() -> "Client":
+    """Read/search client, created on first use."""
+    from supabase import create_client
+    return create_client(SUPABASE_URL, os.getenv("SUPABASE_KEY"))
+
+
+@lru_cache(maxsize=None)
+def get_supabase_admin() -> Optional["Client"]:
+    """Write client (SERVER ONLY), created on first use.
+    Returns None when no service role key is configured."""
+    service_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+    if not service_key:
+        return None
+    from supabase import create_client
+    return create_client(SUPABASE_URL, service_key)
@@ -0,0 +1,185 @@
+import hashlib
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+from typing import Callable, Optional
+
+from .coalesce import KeyedLocks
+from .local_db import connect, default_db_path, ensure_private_file
+
+log = logging.getLogger("playlistgen")
+
+# Refresh this many seconds before Spotify says the token expires
+REFRESH_LEEWAY = int(os.getenv("TOKEN_REFRESH_LEEWAY", "120"))
+
+# How long one worker may hold the refresh lease before others take over
+LEASE_SECONDS = 15
+
+# How long a login handle in the session cookie stays valid
+LOGIN_TTL = 30 * 24 * 3600
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS spotify_tokens (
+    spotify_id   TEXT PRIMARY KEY,
+    token_info   TEXT NOT NULL,
+    expires_at   INTEGER NOT NULL,
+    lease_until  REAL NOT NULL DEFAULT 0
+)
+"""
+
+# The cookie carries a random handle, never the spotify_id itself, so a
+# forged session can't claim someone else's tokens. Only hashes are stored.
+_LOGIN_SCHEMA = """
+CREATE TABLE IF NOT EXISTS login_handles (
+    handle_hash  TEXT PRIMARY KEY,
+    spotify_id   TEXT NOT NULL,
+    expires_at   REAL NOT NULL
+)
+"""
+
+
+def _hash_handle(handle: str) -> str:
+    return hashlib.sha256(handle.encode()).hexdigest()
+
+
+def _is_fresh(token_info: Optional[dict], leeway: int = REFRESH_LEEWAY) -> bool:
+    """True if the token is usable for at least `leeway` more seconds."""
+    if not token_info:
+        return False
+    return token_info.get("expires_at", 0) - time.time() > leeway
+
+
+class TokenStore:
+    """Server-side Spotify token store shared by every thread and
+    gunicorn worker on the host, backed by a local SQLite file.
+
+    Refreshes are single-flight: threads in one worker serialize on a
+    per-user lock, and workers claim a short lease row in SQLite so only
+    one of them calls accounts.spotify.com per expiry. Everyone else
+    waits for the new token to land in the store."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._locks = KeyedLocks()
+        # holds refresh tokens: owner read/write only
+        ensure_private_file(path)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(_SCHEMA)
+            conn.execute(_LOGIN_SCHEMA)
+
+    def _connect(self):
+        return connect(self.path)
+
+    def load(self, spotify_id: str) -> Optional[dict]:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT token_info FROM spotify_tokens WHERE spotify_id = ?",
+                (spotify_id,),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save(self, spotify_id: str, token_info: dict) -> None:
+        """Insert/replace the token and release any refresh lease."""
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO spotify_tokens (spotify_id, token_info, expires_at, lease_until) "
+                "VALUES (?, ?, ?, 0) "
+                "ON CONFLICT(spotify_id) DO UPDATE SET "
+                "token_info = excluded.token_info, expires_at = excluded.expires_at, lease_until = 0",
+                (spotify_id, json.dumps(token_info), int(token_info.get("expires_at", 0))),
+            )
+
+    def create_login(self, spotify_id: str) -> str:
+        """Issue a random login handle for spotify_id to put in the session."""
+        handle = secrets.token_urlsafe(32)
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("DELETE FROM login_handles WHERE expires_at < ?", (now,))
+            conn.execute(
+                "INSERT INTO login_handles (handle_hash, spotify_id, expires_at) VALUES (?, ?, ?)",
+                (_hash_handle(handle), spotify_id, now + LOGIN_TTL),
+            )
+        return handle
+
+    def resolve_login(self, handle: Optional[str]) -> Optional[str]:
+        """spotify_id for a live login handle, else None."""
+        if not handle:
+            return None
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT spotify_id FROM login_handles WHERE handle_hash = ? AND expires_at > ?",
+                (_hash_handle(handle), time.time()),
+            ).fetchone()
+        return row[0] if row else None
+
+    def _claim_lease(self, spotify_id: str) -> bool:
+        """Atomically take the refresh lease if the token is still stale
+        and nobody else holds a live lease."""
+        now = time.time()
+        with self._connect() as conn:
+            cur = conn.execute(
+                "UPDATE spotify_tokens SET lease_until = ? "
+                "WHERE spotify_id = ? AND lease_until < ? AND expires_at - ? <= ?",
+                (now + LEASE_SECONDS, spotify_id, now, now, REFRESH_LEEWAY),
+            )
+            return cur.rowcount == 1
+
+    def _release_lease(self, spotify_id: str) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE spotify_tokens SET lease_until = 0 WHERE spotify_id = ?",
+                (spotify_id,),
+            )
+
+    def get_fresh(self, spotify_id: str, refresh: Callable[[str], dict]) -> Optional[dict]:
+        """Return a token for spotify_id that is valid beyond the leeway,
+        calling refresh(refresh_token) at most once across all workers."""
+        token_info = self.load(spotify_id)
+        if token_info is None or _is_fresh(token_info):
+            return token_info
+
+        with self._locks.hold(spotify_id):
+            deadline = time.time() + LEASE_SECONDS
+            while True:
+                token_info = self.load(spotify_id)
+                if token_info is None or _is_fresh(token_info):
+                    return token_info
+
+                if self._claim_lease(spotify_id):
+                    try:
+                        new_info = refresh(token_info["refresh_token"])
+                    except Exception:
+                        self._release_lease(spotify_id)
+                        raise
+                    # Spotify doesn't always rotate the refresh token
+                    new_info.setdefault("refresh_token", token_info["refresh_token"])
+                    self.save(spotify_id, new_info)
+                    log.info("tokens: refreshed | spotify_id=%s", spotify_id)
+                    return new_info
+
+                # Another worker is refreshing; wait for it to publish
+                if time.time() > deadline:
+                    log.warning("tokens: refresh lease wait timed out | spotify_id=%s", spotify_id)
+                    # Still usable if only the leeway has run out
+                    return token_info if _is_fresh(token_info, leeway=0) else None
+                time.sleep(0.1)
+
+
+_store: Optional[TokenStore] = None
+_store_guard = threading.Lock()
+
+
+def get_token_store() -> TokenStore:
+    """Process-wide TokenStore, opened on first use.
+    The file lives at TOKEN_STORE_PATH (defaults to the app's instance folder)."""
+    global _store
+    if _store is None:
+        with _store_guard:
+            if _store is None:
+                path = os.getenv("TOKEN_STORE_PATH") or default_db_path("spotify_tokens.sqlite3")
+                _store = TokenStore(path)
+    return _store
@@ -0,0 +1,72 @@
+"""Bulk-load lyric embeddings from a catalog file of (track_id, title, artist).
+
+Usage:
+    python scripts/backfill_embeddings.py tracks.csv
+    python scripts/backfill_embeddings.py tracks.jsonl --workers 16 --batch 500
+    python scripts/backfill_embeddings.py tracks.csv --limit 1000   # trial run
+    python scripts/backfill_embeddings.py tracks.csv --retry-failed # redo failures
+
+    # re-embed the live catalog into a new table with LYRICS_PREPROCESS
+    python scripts/backfill_embeddings.py catalog.csv --export-catalog
+    LYRICS_PREPROCESS=1 python scripts/backfill_embeddings.py catalog.csv --table song_embeddings_v2
+
+CSV files need a header row with track_id,title,artist; JSONL lines need the
+same keys. Progress is checkpointed to <input>.checkpoint.json after every
+batch, so re-running the same command resumes where it stopped. Tracks that
+fail (no lyrics, OpenAI errors, timeouts) go to <input>.failed.jsonl;
+--retry-failed runs just those again. Writes go to EMBEDDINGS_TABLE unless
+--table names another one.
+Needs SUPABASE_SERVICE_ROLE_KEY, OPENAI_API_KEY and GENIUS_API_KEY.
+"""
+import argparse
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from app.config import EMBEDDINGS_TABLE  # noqa: E402
+from app.services.backfill import run_backfill, retry_failed, export_catalog, DEFAULT_PRICE_PER_1M  # noqa: E402
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("input", help=".csv or .jsonl catalog file")
+    ap.add_argument("--checkpoint", help="checkpoint path (default: <input>.checkpoint.json)")
+    ap.add_argument("--workers", type=int, default=8, help="parallel lyrics/embedding calls")
+    ap.add_argument("--batch", type=int, default=200, help="rows per lookup/upsert/checkpoint")
+    ap.add_argument("--limit", type=int, help="stop after this many rows in this run")
+    ap.add_argument("--export-catalog", action="store_true",
+                    help="write the tracks in EMBEDDINGS_TABLE to <input> and exit")
+    ap.add_argument("--table", default=EMBEDDINGS_TABLE,
+                    help="table to embed into (default: EMBEDDINGS_TABLE), e.g. a new table "
+                         "for a LYRICS_PREPROCESS / EMBEDDING_DIMENSIONS re-embed")
+    ap.add_argument("--retry-failed", action="store_true",
+                    help="re-run the tracks in <input>.failed.jsonl instead of the input")
+    ap.add_argument("--price-per-1m", type=float, default=DEFAULT_PRICE_PER_1M,
+                    help="embedding price in USD per 1M tokens")
+    args = ap.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+
+    if args.export_catalog:
+        with create_app().app_context():
+            print(f"exported {export_catalog(args.input)} tracks to {args.input}")
+        return
+
+    opts = dict(workers=args.workers, batch_size=args.batch,
+                price_per_1m=args.price_per_1m, limit=args.limit, table=args.table)
+    if args.retry_failed:
+        st = retry_failed(create_app(), args.input, **opts)
+        if st is None:
+            print("nothing to retry")
+            return
+    else:
+        st = run_backfill(create_app(), args.input, checkpoint_path=args.checkpoint, **opts)
+    print(f"done: rows={st['rows']} embedded={st['embedded']} skipped={st['skipped']} "
+          f"failed={st['failed']} tokens={st['tokens']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Time per 100 tracks for large playlist output: candidate resolution
+(parallel Spotify searches) and chunked playlist_add_items writes.
+
+Runs offline against a fake Spotify client with a fixed per-call latency,
+so numbers reflect the pipeline shape rather than network noise.
+
+Usage:
+    python scripts/bench_playlist_output.py --tracks 1000 --latency 0.15
+    python scripts/bench_playlist_output.py --fail-rate 0.2   # exercise chunk retries
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services import recommender, spotify_api  # noqa: E402
+
+
+class FakeSpotify:
+    """Just enough of spotipy.Spotify for resolution and writes."""
+
+    def __init__(self, latency, fail_rate):
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.playlist_items = []
+        self.calls = {"search": 0, "add": 0}
+
+    def search(self, q, type="track", limit=1):
+        self.calls["search"] += 1
+        time.sleep(self.latency)
+        n = abs(hash(q)) % 10**9
+        return {"tracks": {"items": [{"id": str(n), "uri": f"spotify:track:{n}"}]}}
+
+    def playlist_add_items(self, playlist_id, items, position=None):
+        self.calls["add"] += 1
+        time.sleep(self.latency)
+        if random.random() < self.fail_rate:
+            raise RuntimeError("simulated 502")
+        self.playlist_items[position:position] = items
+        return {"snapshot_id": f"snap{self.calls['add']}"}
+
+    def playlist(self, playlist_id, fields=None):
+        return {"snapshot_id": "snap", "tracks": {"total": len(self.playlist_items)}}
+
+
+def fake_pages(total, page_size=200):
+    rows = [{"track_name": f"Song {i}", "artist_name": f"Artist {i % 97}"} for i in range(total)]
+    for i in range(0, total, page_size):
+        yield rows[i:i + page_size]
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--tracks", type=int, default=1000)
+    ap.add_argument("--latency", type=float, default=0.15, help="seconds per fake API call")
+    ap.add_argument("--workers", type=int, default=recommender.RESOLVE_WORKERS)
+    ap.add_argument("--fail-rate", type=float, default=0.0)
+    args = ap.parse_args()
+
+    sp = FakeSpotify(args.latency, args.fail_rate)
+
+    t0 = time.perf_counter()
+    uris = recommender.resolve_candidates(sp, fake_pages(args.tracks * 2), args.tracks, set(),
+                                          workers=args.workers)
+    t1 = time.perf_counter()
+    added, snapshot = spotify_api.add_tracks_in_chunks(sp, "bench", uris,
+                                                     backoff=args.latency)
+    t2 = time.perf_counter()
+
+    per100 = lambda secs, n: 100 * secs / max(n, 1)
+    print(f"tracks={len(uris)} latency={args.latency}s workers={args.workers}")
+    print(f"resolve  {t1 - t0:6.2f}s  {per100(t1 - t0, len(uris)):.2f}s per 100 tracks  ({sp.calls['search']} searches)")
+    print(f"write    {t2 - t1:6.2f}s  {per100(t2 - t1, added):.2f}s per 100 tracks  ({sp.calls['add']} add calls)")
+    print(f"added={added} in_order={sp.playlist_items == uris[:added]} snapshot={snapshot}")
+
+
+if __name__ == "__main__":
+    main()
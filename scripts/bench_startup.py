@@ -0,0 +1,88 @@
+"""Measure worker boot cost: import time of the app package and
+time-to-first-response for "/" on a freshly created app.
+
+Usage:
+    python scripts/bench_startup.py            # summary
+    python scripts/bench_startup.py --top 20   # plus the slowest imports
+    python scripts/bench_startup.py --runs 5
+
+Each run is a fresh interpreter so nothing is cached between runs.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs inside the child interpreter
+CHILD = r"""
+import time
+t0 = time.perf_counter()
+from app import create_app
+app = create_app()
+t1 = time.perf_counter()
+resp = app.test_client().get("/")
+t2 = time.perf_counter()
+print(f"BENCH boot_ms={(t1 - t0) * 1000:.1f} first_response_ms={(t2 - t0) * 1000:.1f} status={resp.status_code}")
+"""
+
+
+def run_once():
+    """Run one cold start with -X importtime and return (boot_ms, first_ms, imports)."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", CHILD],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        sys.stderr.write(proc.stderr)
+        raise SystemExit(proc.returncode)
+
+    boot_ms = first_ms = None
+    for line in proc.stdout.splitlines():
+        if line.startswith("BENCH "):
+            fields = dict(kv.split("=") for kv in line.split()[1:])
+            boot_ms = float(fields["boot_ms"])
+            first_ms = float(fields["first_response_ms"])
+
+    # "import time: self [us] | cumulative | imported package"
+    imports = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cum_us, name = line[len("import time:"):].split("|")
+        imports.append((int(cum_us), int(self_us), name.rstrip()))
+    return boot_ms, first_ms, imports
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--runs", type=int, default=3)
+    ap.add_argument("--top", type=int, default=0, help="show the N slowest top-level imports")
+    args = ap.parse_args()
+
+    boots, firsts, imports = [], [], []
+    for _ in range(args.runs):
+        boot_ms, first_ms, imports = run_once()
+        boots.append(boot_ms)
+        firsts.append(first_ms)
+
+    print(f"runs={args.runs}")
+    print(f"create_app        median={statistics.median(boots):.1f} ms  min={min(boots):.1f} ms")
+    print(f"first response /  median={statistics.median(firsts):.1f} ms  min={min(firsts):.1f} ms")
+
+    heavy = ("numpy", "bs4", "openai", "supabase", "spotipy")
+    loaded = sorted({name.strip().split(".")[0] for _, _, name in imports} & set(heavy))
+    print(f"heavy modules imported: {', '.join(loaded) or 'none'}")
+
+    if args.top:
+        # top-level packages only (importtime indents nested imports)
+        top = [i for i in imports if not i[2].startswith("  ")]
+        print(f"\nslowest {args.top} imports (cumulative us):")
+        for cum, _, name in sorted(top, reverse=True)[:args.top]:
+            print(f"{cum:>10}  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Evaluate lyric preprocessing: tokens sent per song, and how much the
+nearest neighbours move compared with the embeddings already stored.
+
+For a sample of EMBEDDINGS_TABLE rows it re-fetches lyrics, counts the tokens
+the old fixed-slice path would send versus the preprocessed chunks, embeds
+with preprocessing, and reports neighbour overlap@k:
+  - within the sample (old stored vectors vs new vectors), any --dimensions
+  - against the whole catalog via MATCH_RPC (full size only)
+
+Usage:
+    python scripts/eval_lyrics_preprocess.py --sample 200 --k 10
+    python scripts/eval_lyrics_preprocess.py --sample 200 --dimensions 512
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+
+from app import create_app  # noqa: E402
+from app.config import EMBEDDINGS_TABLE  # noqa: E402
+from app.services.supabase_db import get_supabase_anon  # noqa: E402
+from app.services.lyrics_getter import get_lyrics  # noqa: E402
+from app.services.lyrics_embedding import embed_text, find_similar_songs  # noqa: E402
+from app.services.lyrics_preprocess import preprocess_lyrics, count_tokens  # noqa: E402
+
+
+def load_sample(n):
+    rows = (
+        get_supabase_anon()
+        .table(EMBEDDINGS_TABLE)
+        .select("track_id,track_name,artist_name,embedding")
+        .limit(n)
+        .execute()
+        .data
+    ) or []
+    for r in rows:
+        # pgvector columns come back from PostgREST as "[0.1,0.2,...]"
+        if isinstance(r["embedding"], str):
+            r["embedding"] = json.loads(r["embedding"])
+    return rows
+
+
+def knn(vectors, k):
+    """Indices of each row's k nearest other rows by cosine similarity."""
+    m = np.array(vectors, dtype=float)
+    m /= np.linalg.norm(m, axis=1, keepdims=True)
+    sims = m @ m.T
+    np.fill_diagonal(sims, -np.inf)
+    return [set(np.argsort(-row)[:k]) for row in sims]
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--sample", type=int, default=100)
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--dimensions", type=int, help="embed with a shorter vector size")
+    ap.add_argument("--max-chunk-tokens", type=int, default=512)
+    args = ap.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        old_tokens, new_tokens, billed = [], [], {}
+        old_vecs, new_vecs, used = [], [], []
+        for r in load_sample(args.sample):
+            lyrics = get_lyrics(r["track_name"], r["artist_name"])
+            if not lyrics:
+                continue
+            emb = embed_text(lyrics, usage=billed, preprocess=True, max_chunk_tokens=args.max_chunk_tokens,
+                             dimensions=args.dimensions)
+            if emb is None:
+                continue
+            old_tokens.append(count_tokens(lyrics))
+            new_tokens.append(sum(s.tokens for s in preprocess_lyrics(lyrics, args.max_chunk_tokens)))
+            old_vecs.append(r["embedding"])
+            new_vecs.append(emb)
+            used.append(r)
+
+        n = len(used)
+        if n <= args.k:
+            sys.exit(f"only {n} usable tracks; need more than k={args.k}")
+
+        saved = 1 - sum(new_tokens) / sum(old_tokens)
+        print(f"tracks={n}")
+        print(f"tokens/song   old mean={statistics.mean(old_tokens):.0f} median={statistics.median(old_tokens):.0f}"
+              f" | new mean={statistics.mean(new_tokens):.0f} median={statistics.median(new_tokens):.0f}"
+              f" | -{saved:.1%} (billed this run: {billed.get('tokens', 0)})")
+
+        old_nn, new_nn = knn(old_vecs, args.k), knn(new_vecs, args.k)
+        overlap = [len(a & b) / args.k for a, b in zip(old_nn, new_nn)]
+        print(f"overlap@{args.k} within sample  mean={statistics.mean(overlap):.3f}"
+              f" median={statistics.median(overlap):.3f}")
+
+        if args.dimensions and args.dimensions != len(old_vecs[0]):
+            print("catalog overlap skipped: stored vectors have a different size")
+            return
+        def neighbours(vec, me):
+            """The k nearest catalog tracks, not counting the query track itself."""
+            me_keys = {me["track_id"], (me["artist_name"], me["track_name"])}
+            out = []
+            for s in find_similar_songs(vec, top_n=args.k + 1) or []:
+                if s.get("track_id") in me_keys or (s.get("artist_name"), s.get("track_name")) in me_keys:
+                    continue
+                out.append(s.get("track_id") or (s.get("artist_name"), s.get("track_name")))
+            return set(out[:args.k])
+
+        cat = []
+        for me, old, new in zip(used, old_vecs, new_vecs):
+            cat.append(len(neighbours(old, me) & neighbours(new, me)) / args.k)
+        print(f"overlap@{args.k} vs catalog    mean={statistics.mean(cat):.3f}"
+              f" median={statistics.median(cat):.3f}")
+
+
+if __name__ == "__main__":
+    main()
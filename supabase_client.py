@@ -1,21 +1,26 @@
 import os
+from functools import lru_cache
 from dotenv import load_dotenv
-from supabase import create_client, Client
 
 load_dotenv()
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+
+@lru_cache(maxsize=None)
+def get_supabase():
+    """Create the Supabase client on first use instead of at import time."""
+    from supabase import create_client
+    return create_client(SUPABASE_URL, SUPABASE_KEY)
 
 def get_cached_recs(track, artist):
-    response = supabase.table("twitter_recs").select("results").eq("track", track.lower()).eq("artist", artist.lower()).limit(1).execute()
+    response = get_supabase().table("twitter_recs").select("results").eq("track", track.lower()).eq("artist", artist.lower()).limit(1).execute()
     data = response.data
     return data[0]["results"] if data else None
 
 def save_recs_to_cache(track, artist, results):
-    supabase.table("twitter)_recs").insert({
+    get_supabase().table("twitter)_recs").insert({
         'track': track.lower(),
         'artist': artist.lower(),
         'results': results
-    }).execute()
\ No newline at end of file
+    }).execute()